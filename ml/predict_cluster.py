@@ -1,141 +1,96 @@
 #!/usr/bin/env python3
 """
-ML Model for PDF Cluster Prediction - SIMPLIFIED VERSION
+ML Model for PDF Cluster Prediction - thin client for ml/worker.py
+
+The worker keeps the vectorizer and kmeans models loaded; callers that
+predict many PDFs should keep it alive and write one path per line to its
+stdin (or use predict() below) instead of running this script once per PDF.
+A one-shot run imports the worker in-process rather than spawning it:
+
+    python3 ml/predict_cluster.py --serve    # long-running, path per line
+    python3 ml/predict_cluster.py file.pdf   # one-shot
 """
 import sys
 import os
-import warnings
 
-# Suppress warnings
-warnings.filterwarnings("ignore")
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')
+
+_worker = None
+
+# Diagnostics cost a stderr write per message, so they are opt-in
+DEBUG = os.environ.get("ML_DEBUG") == "1"
 
 def log(message):
-    print(f"[ML] {message}", file=sys.stderr, flush=True)
+    if DEBUG:
+        print(f"[ML] {message}", file=sys.stderr)
+
+def get_worker():
+    """Spawn the prediction worker on first use and reuse it afterwards"""
+    global _worker
+    if _worker is None or _worker.poll() is not None:
+        # Only pay for subprocess once there is a PDF to predict
+        import subprocess
+        _worker = subprocess.Popen(
+            [sys.executable, WORKER_PATH],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+    return _worker
+
+def predict(pdf_path):
+    """Send one PDF path to the worker and return its "cluster,confidence" line"""
+    worker = get_worker()
+    worker.stdin.write(pdf_path + "\n")
+    worker.stdin.flush()
+    return worker.stdout.readline().strip()
+
+def close_worker():
+    global _worker
+    if _worker is not None:
+        try:
+            _worker.stdin.close()
+        except OSError:
+            pass
+        _worker.wait()
+        _worker = None
 
 def main():
     # Default fallback values
     DEFAULT_CLUSTER = 0
     DEFAULT_CONFIDENCE = 0.5
-    
+
     try:
+        # Long-running callers talk to the worker directly over stdin/stdout
+        if sys.argv[1:2] == ["--serve"]:
+            os.execv(sys.executable, [sys.executable, WORKER_PATH])
+
         log("Starting ML prediction")
-        
+
         # Check arguments
         if len(sys.argv) < 2:
             log("No PDF path provided")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
+            sys.stdout.write(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}\n")
             return
-        
-        pdf_path = sys.argv[1]
-        log(f"Processing: {pdf_path}")
-        
+
+        pdf_path = os.path.abspath(sys.argv[1])
+
         # Check if file exists
         if not os.path.exists(pdf_path):
             log("File not found")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
+            sys.stdout.write(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}\n")
             return
-        
-        # ==================== IMPORT SECTION ====================
-        # Try to import Python libraries
-        try:
-            # PDF library - use pypdf (newer, works better)
-            from pypdf import PdfReader
-            log("Using pypdf for PDF reading")
-        except ImportError:
-            log("ERROR: pypdf not installed!")
-            log("Please run: pip install pypdf")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
-            return
-        
-        try:
-            # ML libraries
-            import joblib
-            from sklearn.metrics import pairwise_distances_argmin_min
-            log("ML libraries imported successfully")
-        except ImportError as e:
-            log(f"ERROR: ML libraries not installed: {e}")
-            log("Please run: pip install scikit-learn joblib")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
-            return
-        # =======================================================
-        
-        # Check for ML model files
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        vectorizer_path = os.path.join(script_dir, 'vectorizer.joblib')
-        kmeans_path = os.path.join(script_dir, 'kmeans.joblib')
-        
-        if not os.path.exists(vectorizer_path):
-            log(f"ERROR: vectorizer.joblib not found at {vectorizer_path}")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
-            return
-        
-        if not os.path.exists(kmeans_path):
-            log(f"ERROR: kmeans.joblib not found at {kmeans_path}")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
-            return
-        
-        log("All model files found")
-        
-        # Load ML models
-        try:
-            vectorizer = joblib.load(vectorizer_path)
-            kmeans = joblib.load(kmeans_path)
-            log("Models loaded successfully")
-        except Exception as e:
-            log(f"ERROR loading models: {e}")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
-            return
-        
-        # Extract text from PDF
-        try:
-            reader = PdfReader(pdf_path)
-            text = ""
-            
-            # Read only first page to be fast
-            if len(reader.pages) > 0:
-                page = reader.pages[0]
-                page_text = page.extract_text()
-                if page_text:
-                    text = page_text[:5000]  # Limit text length
-            
-            if not text.strip():
-                text = "research paper academic thesis"
-                log("Used placeholder text (no text extracted)")
-            
-            log(f"Extracted {len(text)} characters")
-            
-        except Exception as e:
-            log(f"ERROR reading PDF: {e}")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
-            return
-        
-        # Make prediction
-        try:
-            # Transform text
-            X = vectorizer.transform([text])
-            
-            # Predict cluster
-            cluster = kmeans.predict(X)[0]
-            
-            # Calculate confidence
-            closest, distances = pairwise_distances_argmin_min(X, kmeans.cluster_centers_)
-            distance = distances[0]
-            confidence = max(0.3, min(0.9, 1.0 - (distance / 15.0)))
-            
-            # Ensure valid cluster number (0-5)
-            cluster = max(0, min(5, cluster))
-            
-            log(f"Prediction: Cluster {cluster}, Confidence {confidence:.2f}")
-            print(f"{cluster},{confidence:.2f}")
-            
-        except Exception as e:
-            log(f"ERROR during prediction: {e}")
-            print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
-            return
-            
+
+        # One PDF gains nothing from a long-lived worker, so skip the second
+        # interpreter and run it here
+        import worker
+        sys.stdout.write(f"{worker.handle_batch([pdf_path])[0]}\n")
+        worker.finish_loading()
+
     except Exception as e:
         log(f"UNEXPECTED ERROR: {e}")
-        print(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}")
+        sys.stdout.write(f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Maintenance step - re-save the joblib models, uncompressed
+
+Re-pickles the models with the installed scikit-learn and keeps them as
+raw, uncompressed joblib pickles, the form the worker can memory-map with
+mmap_mode='r'. The shipped files already are, so this is only needed after
+retraining or upgrading scikit-learn. protocol=5 does not speed up loading:
+joblib writes numpy arrays through its own wrapper, not out-of-band buffers.
+Run: python3 ml/resave_models.py
+"""
+import sys
+import os
+import warnings
+
+# Suppress warnings
+warnings.filterwarnings("ignore")
+
+MODEL_NAMES = ('vectorizer', 'kmeans')
+
+def log(message):
+    print(f"[ML] {message}", file=sys.stderr, flush=True)
+
+def main():
+    import joblib
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in MODEL_NAMES:
+        path = os.path.join(script_dir, f'{name}.joblib')
+        if not os.path.exists(path):
+            log(f"ERROR: {name}.joblib not found at {path}")
+            return 1
+
+        # Write beside the model and rename, so a failed dump never leaves a
+        # truncated .joblib in place of the committed one
+        tmp_path = f"{path}.{os.getpid()}"
+        try:
+            joblib.dump(joblib.load(path), tmp_path, protocol=5, compress=0)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        log(f"Re-saved {name}.joblib with protocol 5")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+ML Worker for PDF Cluster Prediction - loads the models once, then answers
+one PDF path per stdin line with a "cluster,confidence" line on stdout
+
+Can also be imported: preload() then predict(pdf_path) -> (cluster, confidence)
+"""
+import sys
+import os
+import hashlib
+import select
+import shutil
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Suppress warnings
+warnings.filterwarnings("ignore")
+
+# Default fallback values
+DEFAULT_CLUSTER = 0
+DEFAULT_CONFIDENCE = 0.5
+
+# Read only the first page to be fast; more pages would change which
+# cluster multi-page documents land in
+MAX_PAGES = 1
+
+# Tokenizing is the costly part of vectorizer.transform and scales with text
+# length, while the TF-IDF vector settles well within the first few KB
+MAX_CHARS = 4096
+
+# Most queued PDF paths answered with a single transform/predict pass
+MAX_BATCH = 32
+
+PDF_MAGIC = b'%PDF-'
+
+# "pypdfium2" (default, pypdf as fallback) or "pypdf" to read with pypdf only
+PDF_BACKENDS = ("pypdfium2", "pypdf")
+PDF_BACKEND = os.environ.get("PDF_BACKEND", "pypdfium2").strip().lower()
+
+# Model files live next to this script
+_ML_DIR = os.path.dirname(os.path.abspath(__file__))
+VECTORIZER_PATH = os.path.join(_ML_DIR, 'vectorizer.joblib')
+KMEANS_PATH = os.path.join(_ML_DIR, 'kmeans.joblib')
+
+# tmpfs copies of the models, memory-mapped and shared by every worker; they
+# outlive worker restarts so later loads never touch the disk
+SHM_DIR = '/dev/shm/digilib'
+
+# Diagnostics cost a stderr write per message, so they are opt-in
+DEBUG = os.environ.get("ML_DEBUG") == "1"
+
+def log(message):
+    if DEBUG:
+        print(f"[ML] {message}", file=sys.stderr)
+
+def log_error(message, e):
+    """Log an exception by class and message; the traceback only in debug mode"""
+    # Errors are always reported, bypassing log(); formatting the traceback
+    # reads source files, so that part stays opt-in
+    print(f"[ML] {message}: {type(e).__name__}: {e}", file=sys.stderr)
+    if DEBUG:
+        import traceback
+        traceback.print_exc(file=sys.stderr)
+
+# ==================== IMPORT SECTION ====================
+# Heavy libraries are imported once per worker, not once per PDF
+if PDF_BACKEND not in PDF_BACKENDS:
+    log(f"Unknown PDF_BACKEND {PDF_BACKEND!r}, expected one of {', '.join(PDF_BACKENDS)}; using pypdfium2")
+    PDF_BACKEND = "pypdfium2"
+
+pdfium = None
+if PDF_BACKEND == "pypdfium2":
+    try:
+        # PDF library - pypdfium2 (C++ PDFium engine, much faster text extraction)
+        import pypdfium2 as pdfium
+        log("Using pypdfium2 for PDF reading")
+    except ImportError:
+        log("pypdfium2 not installed, falling back to pypdf")
+else:
+    log("Using pypdf for PDF reading")
+
+try:
+    # Fallback PDF library - pypdf (pure Python)
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+if pdfium is None and PdfReader is None:
+    log("ERROR: no PDF library installed!")
+    log("Please run: pip install pypdfium2 pypdf")
+
+# ML libraries (joblib, numpy, and sklearn via unpickling) are imported by
+# load_models() in the background, only once a readable PDF turns up
+joblib = None
+np = None
+# =======================================================
+
+def _load_mmap(path, st):
+    """joblib.load a model memory-mapped from its tmpfs copy, refreshing the copy if stale"""
+    if os.path.isdir('/dev/shm'):
+        try:
+            # One cache directory per source file, so checkouts never share copies
+            path = os.path.abspath(path)
+            cache_dir = os.path.join(SHM_DIR, hashlib.sha1(os.fsencode(path)).hexdigest()[:16])
+            shm_path = os.path.join(cache_dir, os.path.basename(path))
+            try:
+                shm_st = os.stat(shm_path)
+                stale = (shm_st.st_size, shm_st.st_mtime_ns) != (st.st_size, st.st_mtime_ns)
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                os.makedirs(cache_dir, exist_ok=True)
+                # Copy then rename, so a concurrent worker never maps a partial file;
+                # copy2 keeps the source mtime for the comparison above
+                tmp_path = f"{shm_path}.{os.getpid()}"
+                try:
+                    shutil.copy2(path, tmp_path)
+                    os.replace(tmp_path, shm_path)
+                except OSError:
+                    # /dev/shm is RAM; never leave a partial copy behind
+                    try:
+                        os.unlink(tmp_path)
+                    except FileNotFoundError:
+                        pass
+                    raise
+            path = shm_path
+        except OSError as e:
+            log(f"Could not cache {path} in {SHM_DIR}: {e}")
+    return joblib.load(path, mmap_mode='r')
+
+def load_model(path):
+    """Load a joblib model memory-mapped, or None if unavailable"""
+    # Check for ML model file; one stat also gives the mtime for the tmpfs copy
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        log(f"ERROR: model not found at {path}")
+        return None
+
+    # Load ML model
+    try:
+        model = _load_mmap(path, st)
+        log(f"Loaded {os.path.basename(path)}")
+        return model
+    except Exception as e:
+        log_error(f"ERROR loading {path}", e)
+        return None
+
+# Models stay resident for the lifetime of the worker
+vectorizer = None
+kmeans = None
+centers_t = None
+center_sq = None
+
+def prepare_models(loaded_vectorizer, loaded_kmeans):
+    """Keep the loaded models and precompute what every prediction reuses"""
+    global vectorizer, kmeans, centers_t, center_sq
+    if loaded_vectorizer is None or loaded_kmeans is None:
+        return
+
+    # transform() rebuilds the analyzer (tokenizer regex, stop-word checks) on
+    # every call; build it once and hand the same one back each time. Any
+    # object whose transform() returns a CSR matrix works (nearest_centers reads
+    # X.data and X.indptr), e.g. a HashingVectorizer -> TfidfTransformer
+    # pipeline, which hashes tokens in C instead of looking up a vocabulary
+    if hasattr(loaded_vectorizer, 'build_analyzer'):
+        analyzer = loaded_vectorizer.build_analyzer()
+        loaded_vectorizer.build_analyzer = lambda: analyzer
+
+    # float32 halves the bandwidth of the sparse-dense product; the confidence
+    # is clipped and printed to 2 decimals, so the precision is not missed.
+    # kmeans.predict() rejects float32 centers against float64 input, so
+    # clusters must come from nearest_centers()
+    loaded_kmeans.cluster_centers_ = np.ascontiguousarray(loaded_kmeans.cluster_centers_, dtype=np.float32)
+
+    # Training-time attributes are never used for prediction; drop them to keep
+    # the resident worker small
+    for attr in ('labels_', 'inertia_', 'n_iter_'):
+        setattr(loaded_kmeans, attr, None)
+    if hasattr(loaded_vectorizer, 'stop_words_'):
+        loaded_vectorizer.stop_words_ = None
+
+    # The centers never change, so keep them transposed and C-contiguous (scipy
+    # would otherwise copy C.T for every product) along with their squared norms
+    centers_t = np.ascontiguousarray(loaded_kmeans.cluster_centers_.T)
+    center_sq = (loaded_kmeans.cluster_centers_ ** 2).sum(axis=1).astype(np.float32)
+    vectorizer, kmeans = loaded_vectorizer, loaded_kmeans
+    log("Models loaded successfully")
+
+def load_models():
+    """Import the ML libraries, then load and prepare vectorizer and kmeans"""
+    global joblib, np
+    try:
+        # ML libraries
+        import joblib
+        import numpy as np
+        log("ML libraries imported successfully")
+    except ImportError as e:
+        log(f"ERROR: ML libraries not installed: {e}")
+        log("Please run: pip install scikit-learn joblib")
+        return
+    except Exception as e:
+        # A broken install must not take the worker down with it
+        log_error("ERROR importing ML libraries", e)
+        return
+
+    # One after the other: unpickling both at once races on the sklearn imports
+    try:
+        prepare_models(load_model(VECTORIZER_PATH), load_model(KMEANS_PATH))
+    except Exception as e:
+        log_error("ERROR preparing models", e)
+
+_model_loader = None
+
+def start_loading():
+    """Start load_models() on a background thread, once, so PDFs are read meanwhile"""
+    global _model_loader
+    if _model_loader is None:
+        executor = ThreadPoolExecutor(max_workers=1)
+        _model_loader = executor.submit(load_models)
+        executor.shutdown(wait=False)
+
+def preload():
+    """Load the models in the calling thread, e.g. in a parent before it forks workers"""
+    global _model_loader
+    if _model_loader is None:
+        # No loader thread is left running, so forked children inherit the
+        # imported libraries and model pages copy-on-write
+        _model_loader = Future()
+        try:
+            load_models()
+        except BaseException as e:
+            # Resolve the Future either way, or models_ready() would wait forever
+            _model_loader.set_exception(e)
+            raise
+        else:
+            _model_loader.set_result(None)
+    return models_ready()
+
+def models_ready():
+    """Wait for the background model load and report if prediction is possible"""
+    start_loading()
+    _model_loader.result()
+    return vectorizer is not None and kmeans is not None
+
+def finish_loading():
+    """Let a started model load finish, so interpreter exit does not cut it off"""
+    if _model_loader is not None:
+        _model_loader.result()
+
+def _pdfium_page_text(pdf, i):
+    # Free the page's PDFium handles as soon as its text is out
+    page = pdf[i]
+    textpage = page.get_textpage()
+    page_text = textpage.get_text_range()
+    textpage.close()
+    page.close()
+    return page_text
+
+def _safe_extract(i, errors, extract_page, *args):
+    """Return extract_page(*args) for page i, or "" (recording the error) so one
+    broken page does not lose the document"""
+    try:
+        return extract_page(*args) or ""
+    except Exception as e:
+        log(f"Skipping page {i + 1}: {e}")
+        errors.append(e)
+        return ""
+
+def _join_pages(parts, errors):
+    """Join the page texts; if pages failed and none produced text, re-raise"""
+    # Skipping broken pages only helps when something was read; otherwise the
+    # backend fallback and the default answer must still apply
+    if errors and not parts:
+        raise errors[-1]
+    return " ".join(parts)[:MAX_CHARS]
+
+def extract_text(pdf_path):
+    """Return up to MAX_CHARS of text from the first MAX_PAGES page(s), preferring pypdfium2"""
+    parts = []
+    errors = []
+    total = 0
+
+    if pdfium is not None:
+        try:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                for i in range(min(MAX_PAGES, len(pdf))):
+                    page_text = _safe_extract(i, errors, _pdfium_page_text, pdf, i)
+                    if page_text:
+                        parts.append(page_text)
+                        total += len(page_text)
+                        # Later pages would only be cut off before vectorizing
+                        if total >= MAX_CHARS:
+                            break
+                return _join_pages(parts, errors)
+            finally:
+                pdf.close()
+        except Exception as e:
+            if PdfReader is None:
+                raise
+            log(f"pypdfium2 failed, trying pypdf: {e}")
+            parts = []
+            errors = []
+            total = 0
+
+    # Walk the pages lazily instead of indexing from len(reader.pages)
+    reader = PdfReader(pdf_path, strict=False)
+    for i, page in zip(range(MAX_PAGES), reader.pages):
+        page_text = _safe_extract(i, errors, page.extract_text)
+        if page_text:
+            parts.append(page_text)
+            total += len(page_text)
+            if total >= MAX_CHARS:
+                break
+    return _join_pages(parts, errors)
+
+def is_pdf(pdf_path):
+    """Check for the %PDF- header, which the spec allows within the first 1024 bytes"""
+    with open(pdf_path, 'rb') as f:
+        return PDF_MAGIC in f.read(1024)
+
+def read_text(pdf_path):
+    """Return the text to vectorize for one PDF, or None to answer with the default"""
+    try:
+        log(f"Processing: {pdf_path}")
+
+        if not pdf_path:
+            log("No PDF path provided")
+            return None
+
+        # Reject HTML error pages, empty and truncated uploads before any parser
+        # starts; opening the file doubles as the existence check
+        try:
+            if not is_pdf(pdf_path):
+                log("Not a PDF file")
+                return None
+        except FileNotFoundError:
+            log("File not found")
+            return None
+
+        # There is something to predict: load the models while this PDF is read
+        start_loading()
+
+        # Extract text from PDF
+        try:
+            text = extract_text(pdf_path)
+
+            if not text.strip():
+                text = "research paper academic thesis"
+                log("Used placeholder text (no text extracted)")
+
+            log(f"Extracted {len(text)} characters")
+            return text
+
+        except Exception as e:
+            log_error("ERROR reading PDF", e)
+            return None
+
+    except Exception as e:
+        log_error("UNEXPECTED ERROR", e)
+        return None
+
+def nearest_centers(X):
+    """Return the nearest center and its distance for every row of X"""
+    # ||x||^2 + ||c||^2 - 2 x.c gives the squared distance from every row to
+    # every center with a single sparse-dense product
+    xc = np.asarray(X.dot(centers_t))
+    # Squared row norms straight from the CSR data, without a second sparse matrix
+    x_sq = np.array([np.dot(X.data[start:end], X.data[start:end])
+                     for start, end in zip(X.indptr[:-1], X.indptr[1:])])
+    d2 = x_sq[:, None] + center_sq[None, :] - 2 * xc
+    clusters = d2.argmin(axis=1)
+    distances = np.sqrt(np.maximum(d2[np.arange(len(clusters)), clusters], 0.0))
+    return clusters, distances
+
+def predict_texts(texts):
+    """Return (cluster, confidence) per text from one transform over the batch"""
+    # Transform text
+    X = vectorizer.transform([text[:MAX_CHARS] for text in texts]).astype(np.float32)
+
+    results = []
+    for cluster, distance in zip(*nearest_centers(X)):
+        # Predict cluster
+        cluster = int(cluster)
+
+        # Calculate confidence
+        confidence = max(0.3, min(0.9, 1.0 - (float(distance) / 15.0)))
+
+        # Ensure valid cluster number (0-5)
+        cluster = max(0, min(5, cluster))
+
+        log(f"Prediction: Cluster {cluster}, Confidence {confidence:.2f}")
+        results.append((cluster, confidence))
+    return results
+
+def predict_batch(pdf_paths):
+    """Return (cluster, confidence) for each PDF path in order, or None where the default applies"""
+    results = [None] * len(pdf_paths)
+
+    if pdfium is None and PdfReader is None:
+        log("ERROR: worker is missing PDF support")
+        return results
+
+    # Unreadable PDFs keep the default; the rest share one prediction pass
+    texts = {}
+    for i, pdf_path in enumerate(pdf_paths):
+        text = read_text(pdf_path)
+        if text is not None:
+            texts[i] = text
+
+    if not texts:
+        return results
+
+    try:
+        if not models_ready():
+            log("ERROR: worker is missing ML support")
+            return results
+
+        for i, result in zip(texts, predict_texts(list(texts.values()))):
+            results[i] = result
+    except Exception as e:
+        log_error("ERROR during prediction", e)
+
+    return results
+
+def predict(pdf_path):
+    """Return (cluster, confidence) for one PDF, falling back to the defaults"""
+    return predict_batch([pdf_path])[0] or (DEFAULT_CLUSTER, DEFAULT_CONFIDENCE)
+
+def handle_batch(pdf_paths):
+    """Return the "cluster,confidence" line for each PDF path, in the same order"""
+    return [f"{DEFAULT_CLUSTER},{DEFAULT_CONFIDENCE}" if result is None else f"{result[0]},{result[1]:.2f}"
+            for result in predict_batch(pdf_paths)]
+
+def read_batches():
+    """Yield stdin lines in batches of whatever is already queued, up to MAX_BATCH"""
+    fd = sys.stdin.fileno()
+    pending = b""
+    eof = False
+    while not eof:
+        chunk = os.read(fd, 65536)
+        eof = not chunk
+        pending += chunk
+
+        # Pick up any further paths that are already waiting, without blocking
+        try:
+            while not eof and pending.count(b"\n") < MAX_BATCH and select.select([fd], [], [], 0)[0]:
+                chunk = os.read(fd, 65536)
+                eof = not chunk
+                pending += chunk
+        except OSError:
+            # select() does not support pipes on Windows
+            pass
+
+        if eof:
+            lines = pending.splitlines()
+        else:
+            *lines, pending = pending.split(b"\n")
+
+        for start in range(0, len(lines), MAX_BATCH):
+            yield [os.fsdecode(line).strip() for line in lines[start:start + MAX_BATCH]]
+
+def main():
+    log("ML worker ready")
+    for batch in read_batches():
+        # One write and flush per batch rather than per line
+        sys.stdout.write("".join(f"{result}\n" for result in handle_batch(batch)))
+        sys.stdout.flush()
+    # A batch of unreadable PDFs starts the load without waiting for it
+    finish_loading()
+
+if __name__ == "__main__":
+    main()